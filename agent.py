@@ -1,86 +1,300 @@
-from typing import List, Dict, Any, Optional
-import json
-from conversation import Conversation
-from tools import Tool
+from __future__ import annotations
 
+from typing import (
+    TYPE_CHECKING,
+    List,
+    Dict,
+    Any,
+    Generator,
+    Generic,
+    Optional,
+    TypeVar,
+)
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from cache import SemanticCache
+from conversation import (
+    BaseConversation,
+    Conversation,
+    AsyncConversation,
+    ConversationBatcher,
+)
+from tools import AsyncHTTPSession, Tool
 
-class Agent:
-    """An agent that has an objective and uses tools to achieve it"""
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessage
+
+# Kept identical across agents so the start of every request shares a prefix
+# that OpenAI's prompt caching can reuse
+SYSTEM_PREAMBLE = (
+    "You are a helpful AI assistant. Think step by step to achieve your objective."
+)
+
+# Added to the first message of run(), the only caller that reads DONE_TRAILER,
+# so replies shown elsewhere (e.g. streamed in the CLI) do not end in JSON
+CONTINUATION_INSTRUCTION = (
+    'If you need another turn to finish, end your reply with {"done": false}.'
+)
+
+# Trailer the model ends its reply with to say whether it has finished
+DONE_TRAILER = re.compile(r'\{\s*"done"\s*:\s*(true|false)\s*\}\s*$')
+
+ConversationT = TypeVar("ConversationT", bound=BaseConversation)
+
+
+class BaseAgent(Generic[ConversationT]):
+    """Setup and tool bookkeeping shared by the synchronous and async agents"""
 
     def __init__(
         self,
         objective: str,
+        conversation: ConversationT,
         tools: Optional[List[Tool]] = None,
         model: str = "gpt-3.5-turbo",
         system_message: Optional[str] = None,
     ):
-        """Initialize the agent with an objective and tools"""
+        """Initialize the agent with an objective, conversation and tools"""
         self.objective = objective
         self.tools = tools or []
+        self._tools_by_name: Dict[str, Tool] = {tool.name: tool for tool in self.tools}
         self.model = model
-        self.conversation = Conversation()
+        self._tools_dict_cache: Optional[List[Dict[str, Any]]] = None
+        self.conversation = conversation
 
-        # Add system message
-        default_system = f"You are a helpful AI assistant with the objective: {objective}. Think step by step to achieve the objective."
-        self.conversation.add_message("system", system_message or default_system)
+        # Add the static system message first, then the agent-specific objective
+        self.conversation.add_message("system", system_message or SYSTEM_PREAMBLE)
+        self.conversation.add_message("system", f"Objective: {objective}")
 
     def add_tool(self, tool: Tool) -> None:
         """Add a tool to the agent"""
         self.tools.append(tool)
+        self._tools_by_name[tool.name] = tool
+        self._tools_dict_cache = None
+
+    @property
+    def tools_dict(self) -> Optional[List[Dict[str, Any]]]:
+        """The tools in OpenAI API format, rebuilt only when a tool is added"""
+        if self._tools_dict_cache is None:
+            # Sort tools by name so the serialized tool list is stable between requests
+            self._tools_dict_cache = [
+                tool.to_dict() for tool in sorted(self.tools, key=lambda t: t.name)
+            ]
+        return self._tools_dict_cache or None
 
-    def send_message(self, content: str) -> Dict[str, Any]:
+    @staticmethod
+    def _needs_continuation(response: ChatCompletionMessage) -> bool:
+        """Check whether the model asked for another turn
+
+        A reply without the trailer counts as finished.
+        """
+        # The trailer is at the end, so only look at the tail
+        match = DONE_TRAILER.search((response.content or "")[-200:])
+        return match is not None and match.group(1) == "false"
+
+
+class Agent(BaseAgent[Conversation]):
+    """An agent that has an objective and uses tools to achieve it"""
+
+    def __init__(
+        self,
+        objective: str,
+        tools: Optional[List[Tool]] = None,
+        model: str = "gpt-3.5-turbo",
+        system_message: Optional[str] = None,
+        cache: Optional[SemanticCache] = None,
+        compress_requests: bool = False,
+        max_messages_in_context: Optional[int] = 20,
+        summarize_model: str = "gpt-4o-mini",
+    ):
+        """Initialize the agent with an objective and tools
+
+        `compress_requests`, `max_messages_in_context` and `summarize_model`
+        are passed on to the Conversation; pass max_messages_in_context=None
+        to keep the full history without summarizing it.
+        """
+        super().__init__(
+            objective,
+            Conversation(
+                cache=cache,
+                max_messages_in_context=max_messages_in_context,
+                summarize_model=summarize_model,
+                compress_requests=compress_requests,
+            ),
+            tools=tools,
+            model=model,
+            system_message=system_message,
+        )
+
+    def send_message(self, content: str) -> ChatCompletionMessage:
         """Send a user message and get a response"""
         self.conversation.add_message("user", content)
         return self._get_response()
 
-    def _get_response(self) -> Dict[str, Any]:
+    def _get_response(self) -> ChatCompletionMessage:
         """Get a response from the OpenAI API and handle tool calls"""
-        tools_dict = [tool.to_dict() for tool in self.tools] if self.tools else None
-
-        response = self.conversation.send(model=self.model, tools=tools_dict)
-
-        # Handle tool calls if present
-        tool_calls = getattr(response, "tool_calls", None)
-        if tool_calls:
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_args = tool_call.function.arguments
-                tool_call_id = tool_call.id
-
-                # Find the matching tool
-                matching_tools = [
-                    tool for tool in self.tools if tool.name == function_name
-                ]
-                if matching_tools:
-                    tool = matching_tools[0]
-                    try:
-                        result = tool.execute(function_args)
-                        self.conversation.add_tool_result(tool_call_id, result)
-                    except Exception as e:
-                        self.conversation.add_tool_result(
-                            tool_call_id, f"Error: {str(e)}"
-                        )
-                else:
-                    self.conversation.add_tool_result(
-                        tool_call_id, f"Error: Tool '{function_name}' not found"
-                    )
+        while True:
+            response = self.conversation.send(model=self.model, tools=self.tools_dict)
+
+            tool_calls = getattr(response, "tool_calls", None)
+            if not tool_calls:
+                return response
+
+            self._handle_tool_calls(tool_calls)
+
+    def stream_message(
+        self, content: str
+    ) -> Generator[str, None, ChatCompletionMessage]:
+        """Send a user message and stream the response text as it is generated
+
+        Tool calls are handled as in send_message. The final response is
+        returned as the generator's value when it finishes.
+        """
+        self.conversation.add_message("user", content)
+        while True:
+            response = yield from self.conversation.send_stream(
+                model=self.model, tools=self.tools_dict
+            )
+
+            tool_calls = getattr(response, "tool_calls", None)
+            if not tool_calls:
+                return response
+
+            self._handle_tool_calls(tool_calls)
+
+    def _handle_tool_calls(self, tool_calls: List[Any]) -> None:
+        """Execute tool calls and add their results to the conversation"""
+        # Run the calls concurrently, then record results in call order
+        with ThreadPoolExecutor(max_workers=len(tool_calls)) as executor:
+            results = list(executor.map(self._execute_tool_call, tool_calls))
 
-            # Get a new response after tool execution
-            return self._get_response()
+        for tool_call, result in zip(tool_calls, results):
+            self.conversation.add_tool_result(tool_call.id, result)
 
-        return response
+    def _execute_tool_call(self, tool_call: Any) -> str:
+        """Execute a single tool call and return its result as a string"""
+        function_name = tool_call.function.name
+        function_args = tool_call.function.arguments
+
+        tool = self._tools_by_name.get(function_name)
+        if tool is None:
+            return f"Error: Tool '{function_name}' not found"
+
+        try:
+            return tool.execute(function_args)
+        except Exception as e:
+            return f"Error: {str(e)}"
 
     def run(self, initial_input: str, max_turns: int = 10) -> List[Dict[str, Any]]:
         """Run the agent with an initial input for a maximum number of turns"""
-        response = self.send_message(initial_input)
+        response = self.send_message(f"{initial_input}\n\n{CONTINUATION_INSTRUCTION}")
         turns = 1
 
         while turns < max_turns:
             # Check if we need to continue
-            if "continue" in response.content.lower():
+            if self._needs_continuation(response):
                 response = self.send_message("Continue")
                 turns += 1
             else:
                 break
 
         return self.conversation.messages
+
+
+class AsyncAgent(BaseAgent[AsyncConversation]):
+    """An agent that runs on asyncio, executing tool calls concurrently"""
+
+    def __init__(
+        self,
+        objective: str,
+        tools: Optional[List[Tool]] = None,
+        model: str = "gpt-3.5-turbo",
+        system_message: Optional[str] = None,
+        cache: Optional[SemanticCache] = None,
+        batcher: Optional[ConversationBatcher] = None,
+        compress_requests: bool = False,
+        max_messages_in_context: Optional[int] = 20,
+        summarize_model: str = "gpt-4o-mini",
+    ):
+        """Initialize the agent, optionally sharing a request batcher
+
+        `compress_requests`, `max_messages_in_context` and `summarize_model`
+        are passed on to the AsyncConversation, as for Agent.
+        """
+        super().__init__(
+            objective,
+            AsyncConversation(
+                cache=cache,
+                max_messages_in_context=max_messages_in_context,
+                summarize_model=summarize_model,
+                compress_requests=compress_requests,
+                batcher=batcher,
+            ),
+            tools=tools,
+            model=model,
+            system_message=system_message,
+        )
+
+    async def send_message(self, content: str) -> ChatCompletionMessage:
+        """Send a user message and get a response
+
+        The web tools share one HTTP session for the call, or the caller's
+        session if it opened an AsyncHTTPSession.
+        """
+        self.conversation.add_message("user", content)
+        async with AsyncHTTPSession.current():
+            return await self._get_response()
+
+    async def _get_response(self) -> ChatCompletionMessage:
+        """Get a response from the OpenAI API and handle tool calls"""
+        while True:
+            response = await self.conversation.send(
+                model=self.model, tools=self.tools_dict
+            )
+
+            tool_calls = getattr(response, "tool_calls", None)
+            if not tool_calls:
+                return response
+
+            # Run the calls concurrently; gather keeps results in call order
+            results = await asyncio.gather(
+                *[self._execute_tool_call(tool_call) for tool_call in tool_calls]
+            )
+
+            for tool_call, result in zip(tool_calls, results):
+                self.conversation.add_tool_result(tool_call.id, result)
+
+    async def _execute_tool_call(self, tool_call: Any) -> str:
+        """Execute a single tool call and return its result as a string"""
+        function_name = tool_call.function.name
+        function_args = tool_call.function.arguments
+
+        tool = self._tools_by_name.get(function_name)
+        if tool is None:
+            return f"Error: Tool '{function_name}' not found"
+
+        try:
+            return await tool.execute_async(function_args)
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    async def run(
+        self, initial_input: str, max_turns: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Run the agent with an initial input for a maximum number of turns"""
+        # Keep one HTTP session open across all turns
+        async with AsyncHTTPSession.current():
+            response = await self.send_message(
+                f"{initial_input}\n\n{CONTINUATION_INSTRUCTION}"
+            )
+            turns = 1
+
+            while turns < max_turns:
+                # Check if we need to continue
+                if self._needs_continuation(response):
+                    response = await self.send_message("Continue")
+                    turns += 1
+                else:
+                    break
+
+        return self.conversation.messages
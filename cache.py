@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import orjson
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import (
+    TYPE_CHECKING,
+    List,
+    Dict,
+    Any,
+    Deque,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessage
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Most similar-question entries kept for one prior context; the oldest is
+# dropped when another is added
+SIMILAR_PER_CONTEXT = 16
+
+
+class SemanticCache:
+    """Caches assistant responses so repeated prompts skip the OpenAI API"""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        embedding_model: str = "text-embedding-3-small",
+        semantic: bool = True,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+    ):
+        """Initialize the cache
+
+        Exact repeats of a conversation are always served from the cache. When
+        `semantic` is enabled, a new user message whose embedding has a cosine
+        similarity of at least `threshold` with a cached one is also a hit, but
+        only if everything before it in the conversation is identical.
+
+        At most `maxsize` responses and `maxsize` prior contexts are kept, each
+        for `ttl` seconds, so a long-running process does not grow without
+        bound.
+        """
+        self.threshold = threshold
+        self.embedding_model = embedding_model
+        self.semantic = semantic
+        self._exact: TTLCache[str, Dict[str, Any]] = TTLCache(maxsize, ttl)
+        self._similar: TTLCache[str, Deque[Tuple[List[float], Dict[str, Any]]]] = (
+            TTLCache(maxsize, ttl)
+        )
+        self._last_embedding: Optional[Tuple[str, List[float]]] = None
+
+    def get(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, Any]],
+        context_chain: List[str],
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> Optional[ChatCompletionMessage]:
+        """Return a cached response for the conversation, or None on a miss"""
+        cached = self._exact.get(request_key(model, tools, context_chain[-1]))
+        if cached is None:
+            query = self._semantic_query(messages, context_chain)
+            if query is not None:
+                context, text = query
+                cached = self._find_similar(
+                    context, self._embed(client, text), model, tools
+                )
+
+        if cached is None:
+            return None
+        return _to_message(cached)
+
+    async def aget(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, Any]],
+        context_chain: List[str],
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> Optional[ChatCompletionMessage]:
+        """Like get, for use with an async OpenAI client"""
+        cached = self._exact.get(request_key(model, tools, context_chain[-1]))
+        if cached is None:
+            query = self._semantic_query(messages, context_chain)
+            if query is not None:
+                context, text = query
+                cached = self._find_similar(
+                    context, await self._aembed(client, text), model, tools
+                )
+
+        if cached is None:
+            return None
+        return _to_message(cached)
+
+    def put(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, Any]],
+        context_chain: List[str],
+        tools: Optional[List[Dict[str, Any]]],
+        message: ChatCompletionMessage,
+    ) -> None:
+        """Store the response the API returned for the conversation"""
+        data = message.model_dump()
+        self._exact.put(request_key(model, tools, context_chain[-1]), data)
+
+        query = self._semantic_query(messages, context_chain)
+        if query is not None:
+            context, text = query
+            key = request_key(model, tools, context)
+            self._add_similar(key, self._embed(client, text), data)
+
+    async def aput(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, Any]],
+        context_chain: List[str],
+        tools: Optional[List[Dict[str, Any]]],
+        message: ChatCompletionMessage,
+    ) -> None:
+        """Like put, for use with an async OpenAI client"""
+        data = message.model_dump()
+        self._exact.put(request_key(model, tools, context_chain[-1]), data)
+
+        query = self._semantic_query(messages, context_chain)
+        if query is not None:
+            context, text = query
+            key = request_key(model, tools, context)
+            self._add_similar(key, await self._aembed(client, text), data)
+
+    def _add_similar(
+        self, key: str, embedding: List[float], data: Dict[str, Any]
+    ) -> None:
+        """Add an entry to the bucket for a prior context, creating it if needed"""
+        bucket = self._similar.get(key)
+        if bucket is None:
+            bucket = deque(maxlen=SIMILAR_PER_CONTEXT)
+        bucket.append((embedding, data))
+        # Storing the bucket again renews its expiry
+        self._similar.put(key, bucket)
+
+    def _semantic_query(
+        self, messages: List[Dict[str, Any]], context_chain: List[str]
+    ) -> Optional[Tuple[str, str]]:
+        """Split the conversation into its parent context hash and final user message
+
+        The parent hash covers every message before the final one, so a similar
+        question only counts as a hit when it follows exactly the same history.
+        """
+        if not self.semantic or not messages:
+            return None
+        last = messages[-1]
+        if last.get("role") != "user" or not last.get("content"):
+            return None
+        parent = context_chain[-2] if len(context_chain) > 1 else ""
+        return parent, last["content"]
+
+    def _find_similar(
+        self,
+        context: str,
+        embedding: List[float],
+        model: str,
+        tools: Optional[List[Dict[str, Any]]],
+    ) -> Optional[Dict[str, Any]]:
+        """Find the closest cached response that shares the same prior context"""
+        best, best_score = None, self.threshold
+        key = request_key(model, tools, context)
+        for candidate, data in self._similar.get(key) or ():
+            score = sum(a * b for a, b in zip(candidate, embedding))
+            if score >= best_score:
+                best, best_score = data, score
+        return best
+
+    def _embed(self, client: Any, text: str) -> List[float]:
+        """Embed text as a unit vector, reusing the previous result for the same text"""
+        if self._last_embedding is not None and self._last_embedding[0] == text:
+            return self._last_embedding[1]
+
+        response = client.embeddings.create(model=self.embedding_model, input=text)
+        return self._remember(text, response.data[0].embedding)
+
+    async def _aembed(self, client: Any, text: str) -> List[float]:
+        """Like _embed, for use with an async OpenAI client"""
+        if self._last_embedding is not None and self._last_embedding[0] == text:
+            return self._last_embedding[1]
+
+        response = await client.embeddings.create(
+            model=self.embedding_model, input=text
+        )
+        return self._remember(text, response.data[0].embedding)
+
+    def _remember(self, text: str, vector: List[float]) -> List[float]:
+        """Normalize an embedding and keep it for the next lookup of the same text"""
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        embedding = [x / norm for x in vector]
+
+        self._last_embedding = (text, embedding)
+        return embedding
+
+
+class TTLCache(Generic[K, V]):
+    """A thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 512, ttl: float = 300.0):
+        """Initialize the cache
+
+        Once `maxsize` entries are stored, adding another evicts the least
+        recently used one.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        """Return the value stored for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: K, value: V) -> None:
+        """Store a value, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        """Remove the entry for key, if any"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def request_key(
+    model: str,
+    tools: Optional[List[Dict[str, Any]]],
+    context_hash: str,
+) -> str:
+    """Hash a request so identical requests map to the same cache entry
+
+    The messages are represented by their context hash (see chain_hash), so the
+    cost of a key does not grow with the length of the conversation.
+    """
+    digest = hashlib.sha256(model.encode("utf-8"))
+    digest.update(b"\0" + orjson.dumps(tools, option=orjson.OPT_SORT_KEYS) + b"\0")
+    digest.update(context_hash.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def chain_hash(parent: str, message: Dict[str, Any]) -> str:
+    """Hash a message together with the hash of everything before it"""
+    digest = hashlib.sha256(parent.encode("utf-8"))
+    digest.update(orjson.dumps(message, option=orjson.OPT_SORT_KEYS))
+    return digest.hexdigest()
+
+
+def _to_message(data: Dict[str, Any]) -> ChatCompletionMessage:
+    """Rebuild a cached assistant message"""
+    from openai.types.chat import ChatCompletionMessage
+
+    return ChatCompletionMessage.model_validate(data)
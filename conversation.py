@@ -1,42 +1,539 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
 import os
-import openai
-from typing import List, Dict, Any, Optional
+import httpx
+from typing import TYPE_CHECKING, List, Dict, Any, Generator, Optional, Set, Tuple
+from cache import SemanticCache, chain_hash, request_key
 
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessage
 
-class Conversation:
-    """Manages the conversation with the OpenAI API"""
+# Instructions for the model that condenses older messages
+SUMMARIZE_PROMPT = (
+    "Summarize the following conversation between a user and an AI assistant. "
+    "Keep every fact, result and decision needed to continue the conversation."
+)
 
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the conversation manager"""
+# Request bodies at least this large are gzip-compressed when enabled
+COMPRESS_THRESHOLD = 8 * 1024
+
+# Adaptive batch size limits for ConversationBatcher
+DEFAULT_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 50
+
+
+def _compress_request(request: httpx.Request) -> httpx.Request:
+    """Return a gzip-compressed copy of a request if its body is large enough"""
+    body = request.read()
+    if len(body) < COMPRESS_THRESHOLD or "Content-Encoding" in request.headers:
+        return request
+
+    # The compressed body gets its own length; streamed bodies had none
+    headers = request.headers.copy()
+    headers["Content-Encoding"] = "gzip"
+    headers.pop("Content-Length", None)
+    headers.pop("Transfer-Encoding", None)
+    return httpx.Request(
+        request.method,
+        request.url,
+        headers=headers,
+        content=gzip.compress(body),
+        extensions=request.extensions,
+    )
+
+
+class _CompressingTransport(httpx.BaseTransport):
+    """Transport that gzip-compresses large request bodies"""
+
+    def __init__(self) -> None:
+        self._transport = httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._transport.handle_request(_compress_request(request))
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class _AsyncCompressingTransport(httpx.AsyncBaseTransport):
+    """Async transport that gzip-compresses large request bodies"""
+
+    def __init__(self) -> None:
+        self._transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Buffer a streamed body first so _compress_request can read it
+        await request.aread()
+        return await self._transport.handle_async_request(_compress_request(request))
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class BaseConversation:
+    """Message history shared by the synchronous and async conversations"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[SemanticCache] = None,
+        max_messages_in_context: Optional[int] = 20,
+        summarize_model: str = "gpt-4o-mini",
+        compress_requests: bool = False,
+    ):
+        """Initialize the conversation manager
+
+        Once the history grows beyond `max_messages_in_context` messages, the
+        older half is replaced with a summary written by `summarize_model`
+        before the next request. Pass None to always send the full history.
+
+        With `compress_requests`, request bodies of COMPRESS_THRESHOLD bytes
+        or more are sent gzip-compressed, which shrinks uploads of long
+        histories.
+        """
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError(
                 "OpenAI API key is required. Set OPENAI_API_KEY environment variable or pass it directly."
             )
 
-        self.client = openai.OpenAI(api_key=self.api_key)
-        self.messages = []
+        self.compress_requests = compress_requests
+        self.client = self._create_client()
+        self.messages: List[Dict[str, Any]] = []
+        self._context_chain: List[str] = []
+        self.cache = cache
+        self.max_messages_in_context = max_messages_in_context
+        self.summarize_model = summarize_model
+        self.summary: Optional[str] = None
+        self._summary_message: Optional[Dict[str, Any]] = None
+
+    def _create_client(self) -> Any:
+        """Create the OpenAI API client
+
+        Subclasses import the OpenAI SDK here rather than at module level, so
+        importing the framework stays cheap until a conversation is created.
+        """
+        raise NotImplementedError(
+            "Conversation subclasses must implement _create_client method"
+        )
 
     def add_message(self, role: str, content: str) -> None:
         """Add a message to the conversation history"""
-        self.messages.append({"role": role, "content": content})
+        self._append({"role": role, "content": content})
 
     def add_tool_result(self, tool_call_id: str, output: str) -> None:
         """Add a tool result to the conversation history"""
-        self.messages.append(
-            {"role": "tool", "tool_call_id": tool_call_id, "content": output}
+        self._append({"role": "tool", "tool_call_id": tool_call_id, "content": output})
+
+    def _add_response(self, message: ChatCompletionMessage) -> None:
+        """Add an assistant response to the conversation history
+
+        Unset fields are dropped and nested tool calls become plain dicts, so
+        the history stays small and JSON-serializable.
+        """
+        self._append(message.model_dump(exclude_none=True, mode="json"))
+
+    def _append(self, message: Dict[str, Any]) -> None:
+        """Append a message and extend the context hash chain with it"""
+        self.messages.append(message)
+        if self._uses_context_chain():
+            self._extend_chain()
+        else:
+            # Drop any chain built earlier so context_chain() rebuilds it
+            self._context_chain.clear()
+
+    def _uses_context_chain(self) -> bool:
+        """Whether requests look up the context chain, so it is kept current"""
+        return self.cache is not None
+
+    def _rehash_from(self, start: int) -> None:
+        """Recompute the context hash chain from messages[start] onwards"""
+        if self._uses_context_chain():
+            del self._context_chain[start:]
+            self._extend_chain()
+        else:
+            self._context_chain.clear()
+
+    def _extend_chain(self) -> None:
+        """Hash the messages that are not in the context chain yet"""
+        for message in self.messages[len(self._context_chain) :]:
+            parent = self._context_chain[-1] if self._context_chain else ""
+            self._context_chain.append(chain_hash(parent, message))
+
+    def context_chain(self) -> List[str]:
+        """Return the hash of each prefix of the conversation
+
+        Entry i identifies messages[: i + 1]. The chain is only maintained as
+        messages are added when a cache or batcher needs it; otherwise, or if
+        the history was edited directly, it is rebuilt from scratch here.
+        """
+        if len(self._context_chain) != len(self.messages):
+            self._context_chain.clear()
+            self._extend_chain()
+        return self._context_chain
+
+    def _compaction_range(self) -> Optional[Tuple[int, int]]:
+        """Find the slice of messages to fold into the summary, if any"""
+        limit = self.max_messages_in_context
+        if limit is None or len(self.messages) <= limit:
+            return None
+
+        # Leading system messages are always kept; an earlier summary is not
+        start = 0
+        while (
+            start < len(self.messages)
+            and self.messages[start]["role"] == "system"
+            and self.messages[start] is not self._summary_message
+        ):
+            start += 1
+
+        # Cut about halfway, at a user message, so tool results are never
+        # separated from the assistant message that requested them
+        middle = start + (len(self.messages) - start) // 2
+        for end in range(middle, len(self.messages)):
+            if self.messages[end]["role"] == "user":
+                break
+        else:
+            return None
+
+        if end - start < 2:
+            return None
+        return start, end
+
+    def _summary_request(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the API request that summarizes the given messages"""
+        transcript = "\n\n".join(
+            f"{message['role']}: {message['content']}"
+            for message in messages
+            if message.get("content")
         )
+        return {
+            "model": self.summarize_model,
+            "messages": [
+                {"role": "system", "content": SUMMARIZE_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+        }
+
+    def _apply_summary(self, start: int, end: int, summary: str) -> None:
+        """Replace messages[start:end] with a single summary message"""
+        self.summary = summary
+        self._summary_message = {
+            "role": "system",
+            "content": f"Prior context: {summary}",
+        }
+        self.messages[start:end] = [self._summary_message]
+        self._rehash_from(start)
+
+
+class Conversation(BaseConversation):
+    """Manages the conversation with the OpenAI API"""
+
+    def _create_client(self) -> Any:
+        """Create the OpenAI API client"""
+        import openai
+
+        if self.compress_requests:
+            return openai.OpenAI(
+                api_key=self.api_key,
+                http_client=openai.DefaultHttpxClient(
+                    transport=_CompressingTransport()
+                ),
+            )
+        return openai.OpenAI(api_key=self.api_key)
 
     def send(
         self, model: str = "gpt-3.5-turbo", tools: Optional[List[Dict[str, Any]]] = None
-    ) -> Dict[str, Any]:
+    ) -> ChatCompletionMessage:
         """Send the conversation to the OpenAI API and get a response"""
+        self._compact()
+
+        if self.cache is not None:
+            cached = self.cache.get(
+                self.client, model, self.messages, self.context_chain(), tools
+            )
+            if cached is not None:
+                self._add_response(cached)
+                return cached
+
         response = self.client.chat.completions.create(
             model=model, messages=self.messages, tools=tools
         )
 
         # Add the assistant's response to our message history
-        message = response.choices[0].message
-        self.messages.append(dict(message))
+        message: ChatCompletionMessage = response.choices[0].message
+        if self.cache is not None:
+            self.cache.put(
+                self.client, model, self.messages, self.context_chain(), tools, message
+            )
+        self._add_response(message)
 
         return message
+
+    def send_stream(
+        self, model: str = "gpt-3.5-turbo", tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Generator[str, None, ChatCompletionMessage]:
+        """Send the conversation to the OpenAI API and stream the response
+
+        Yields pieces of the response text as they arrive. When the stream
+        ends, the complete message is added to the history and returned as
+        the generator's value.
+        """
+        self._compact()
+
+        if self.cache is not None:
+            message = self.cache.get(
+                self.client, model, self.messages, self.context_chain(), tools
+            )
+            if message is not None:
+                if message.content:
+                    yield message.content
+                self._add_response(message)
+                return message
+
+        stream = self.client.chat.completions.create(
+            model=model, messages=self.messages, tools=tools, stream=True
+        )
+
+        content: List[str] = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                content.append(delta.content)
+                yield delta.content
+
+            # Tool calls arrive in fragments, identified by their index
+            for fragment in delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(
+                    fragment.index,
+                    {"type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                if fragment.id:
+                    tool_call["id"] = fragment.id
+                if fragment.function is not None:
+                    if fragment.function.name:
+                        tool_call["function"]["name"] += fragment.function.name
+                    if fragment.function.arguments:
+                        tool_call["function"][
+                            "arguments"
+                        ] += fragment.function.arguments
+
+        from openai.types.chat import ChatCompletionMessage
+
+        message = ChatCompletionMessage.model_validate(
+            {
+                "role": "assistant",
+                "content": "".join(content) or None,
+                "tool_calls": [tool_calls[i] for i in sorted(tool_calls)] or None,
+            }
+        )
+        if self.cache is not None:
+            self.cache.put(
+                self.client, model, self.messages, self.context_chain(), tools, message
+            )
+        self._add_response(message)
+
+        return message
+
+    def _compact(self) -> None:
+        """Replace older messages with a summary once the history is too long"""
+        span = self._compaction_range()
+        if span is None:
+            return
+
+        start, end = span
+        response = self.client.chat.completions.create(
+            **self._summary_request(self.messages[start:end])
+        )
+        self._apply_summary(start, end, response.choices[0].message.content)
+
+
+class ConversationBatcher:
+    """Coalesces identical concurrent requests into a single OpenAI API call
+
+    Requests that arrive within `window` seconds of each other are collected
+    into a batch. Requests in a batch with the same model, tools and messages
+    are sent as one call with `n` set to the number of requests, and each
+    caller gets its own choice from the response. Different requests are
+    still sent separately, since the API cannot answer unrelated prompts in
+    one call.
+
+    The batch size starts at DEFAULT_BATCH_SIZE and triples each time a batch
+    fills up, up to MAX_BATCH_SIZE. Only share a batcher between
+    conversations whose callers may receive independent samples for the same
+    prompt.
+    """
+
+    def __init__(self, window: float = 0.02, max_batch_size: int = MAX_BATCH_SIZE):
+        """Initialize the batcher"""
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self._queue: Optional["asyncio.Queue[Tuple[Any, ...]]"] = None
+        self._worker: Optional["asyncio.Future[None]"] = None
+        # Dispatches in flight; the event loop only keeps weak references
+        self._dispatches: Set["asyncio.Future[None]"] = set()
+
+    async def submit(
+        self,
+        client: Any,
+        model: str,
+        messages: List[Dict[str, Any]],
+        context_hash: str,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> ChatCompletionMessage:
+        """Queue a request and wait for the assistant message answering it
+
+        `context_hash` identifies the messages (the last entry of the
+        conversation's context chain), so grouping needs no hashing here.
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+
+        future: "asyncio.Future[ChatCompletionMessage]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        key = request_key(model, tools, context_hash)
+        self._queue.put_nowait((key, client, model, messages, tools, future))
+
+        # The worker exits once the queue drains, so restart it if needed
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run(self._queue))
+
+        return await future
+
+    async def _run(self, queue: "asyncio.Queue[Tuple[Any, ...]]") -> None:
+        """Collect queued requests into batches and dispatch them"""
+        loop = asyncio.get_running_loop()
+        while not queue.empty():
+            batch = [queue.get_nowait()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            if len(batch) >= self.batch_size:
+                self.batch_size = min(self.batch_size * 3, self.max_batch_size)
+
+            groups: Dict[str, List[Tuple[Any, ...]]] = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for group in groups.values():
+                task = asyncio.ensure_future(self._dispatch(group))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, group: List[Tuple[Any, ...]]) -> None:
+        """Send one API call for a group of identical requests"""
+        _, client, model, messages, tools, _ = group[0]
+        try:
+            response = await client.chat.completions.create(
+                model=model, messages=messages, tools=tools, n=len(group)
+            )
+        except Exception as e:
+            for item in group:
+                # Callers that were cancelled while waiting are already done
+                if not item[-1].done():
+                    item[-1].set_exception(e)
+            return
+
+        choices = sorted(response.choices, key=lambda choice: choice.index)
+        for item, choice in zip(group, choices):
+            if not item[-1].done():
+                item[-1].set_result(choice.message)
+
+
+class AsyncConversation(BaseConversation):
+    """Manages the conversation with the OpenAI API using the async client"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache: Optional[SemanticCache] = None,
+        max_messages_in_context: Optional[int] = 20,
+        summarize_model: str = "gpt-4o-mini",
+        compress_requests: bool = False,
+        batcher: Optional[ConversationBatcher] = None,
+    ):
+        """Initialize the conversation manager"""
+        super().__init__(
+            api_key=api_key,
+            cache=cache,
+            max_messages_in_context=max_messages_in_context,
+            summarize_model=summarize_model,
+            compress_requests=compress_requests,
+        )
+        self.batcher = batcher
+
+    def _uses_context_chain(self) -> bool:
+        """Whether requests look up the context chain, so it is kept current"""
+        return self.cache is not None or self.batcher is not None
+
+    def _create_client(self) -> Any:
+        """Create the async OpenAI API client"""
+        import openai
+
+        if self.compress_requests:
+            return openai.AsyncOpenAI(
+                api_key=self.api_key,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    transport=_AsyncCompressingTransport()
+                ),
+            )
+        return openai.AsyncOpenAI(api_key=self.api_key)
+
+    async def send(
+        self, model: str = "gpt-3.5-turbo", tools: Optional[List[Dict[str, Any]]] = None
+    ) -> ChatCompletionMessage:
+        """Send the conversation to the OpenAI API and get a response"""
+        await self._compact()
+
+        if self.cache is not None:
+            message = await self.cache.aget(
+                self.client, model, self.messages, self.context_chain(), tools
+            )
+            if message is not None:
+                self._add_response(message)
+                return message
+
+        if self.batcher is not None:
+            message = await self.batcher.submit(
+                self.client, model, self.messages, self.context_chain()[-1], tools
+            )
+        else:
+            response = await self.client.chat.completions.create(
+                model=model, messages=self.messages, tools=tools
+            )
+            message = response.choices[0].message
+
+        # Add the assistant's response to our message history
+        if self.cache is not None:
+            await self.cache.aput(
+                self.client, model, self.messages, self.context_chain(), tools, message
+            )
+        self._add_response(message)
+
+        return message
+
+    async def _compact(self) -> None:
+        """Replace older messages with a summary once the history is too long"""
+        span = self._compaction_range()
+        if span is None:
+            return
+
+        start, end = span
+        response = await self.client.chat.completions.create(
+            **self._summary_request(self.messages[start:end])
+        )
+        self._apply_summary(start, end, response.choices[0].message.content)
@@ -4,13 +4,10 @@ import readline
 import atexit
 import time
 from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.prompt import Prompt
-from rich.table import Table
-from agent import Agent
-from tools import Calculator, WebsiteFetcher, SerpApiSearch
+
+# The remaining Rich modules and the agent framework (which pulls in the
+# OpenAI SDK) are imported where they are first used, so the header shows
+# up without waiting for them
 
 # Set up console
 console = Console()
@@ -37,6 +34,8 @@ atexit.register(readline.write_history_file, HISTFILE)
 
 def initialize_agent():
     """Initialize the agent with tools"""
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+
     with Progress(
         SpinnerColumn(),
         TextColumn("[bold blue]Initializing agent...[/bold blue]"),
@@ -44,6 +43,9 @@ def initialize_agent():
     ) as progress:
         task = progress.add_task("", total=None)
 
+        from agent import Agent
+        from tools import Calculator, WebsiteFetcher, SerpApiSearch
+
         # Create an agent with an objective
         agent = Agent(
             objective="Help the user solve problems using available tools",
@@ -71,22 +73,44 @@ def initialize_agent():
     return agent
 
 
-def display_response(response):
-    """Display the agent's response in a readable format"""
-    text = Text(response.content)
-    panel = Panel(
+def response_panel(text):
+    """Wrap the agent's response text in a panel"""
+    from rich.panel import Panel
+
+    return Panel(
         text,
         title="[bold cyan]AGENT RESPONSE[/bold cyan]",
         border_style="cyan",
         expand=False,
         padding=(1, 2),
     )
-    console.print(panel)
+
+
+def display_response(stream):
+    """Display the agent's response as it streams in and return the final message"""
+    from rich.live import Live
+    from rich.spinner import Spinner
+    from rich.text import Text
+
+    text = Text()
+    spinner = Spinner("dots", text="[bold yellow]Agent processing...[/bold yellow]")
+    with Live(spinner, console=console, transient=False) as live:
+        while True:
+            try:
+                delta = next(stream)
+            except StopIteration as stop:
+                live.update(response_panel(text))
+                return stop.value
+
+            text.append(delta)
+            live.update(response_panel(text))
 
 
 def display_tool_usage(response):
     """Display information about tools used in the response"""
     if hasattr(response, "tool_calls") and response.tool_calls:
+        from rich.table import Table
+
         table = Table(title="[bold magenta]Tools Used[/bold magenta]", box=None)
         table.add_column("Tool", style="cyan")
         table.add_column("Usage", style="green")
@@ -119,6 +143,8 @@ def display_ascii_header():
 
 def main():
     """Run the chat interface"""
+    from rich.prompt import Prompt
+
     console.clear()
     display_ascii_header()
 
@@ -140,17 +166,8 @@ def main():
                 )
                 break
 
-            # Show thinking animation
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[bold yellow]Agent processing...[/bold yellow]"),
-                transient=True,
-            ) as progress:
-                task = progress.add_task("", total=None)
-                response = agent.send_message(user_input)
-
-            # Display the response
-            display_response(response)
+            # Stream the response, showing a spinner until the first text arrives
+            response = display_response(agent.stream_message(user_input))
 
             # Display tool usage information if available
             display_tool_usage(response)
@@ -1,131 +1,817 @@
-from typing import Dict, Any, Callable, List, Optional
-import json
-import requests  # Added this import for HTTP requests
+from typing import (
+    Dict,
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    FrozenSet,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+import asyncio
+import atexit
+import contextvars
+import operator
+import httpx
+import orjson
 import os  # For accessing environment variables
+import ssl
+import threading
+import time
+from cache import TTLCache
+
+# ijson is optional; when installed, large search responses are parsed
+# incrementally instead of being loaded into memory all at once
+try:
+    import ijson  # type: ignore
+
+    try:
+        _ijson: Any = ijson.get_backend("yajl2_c")
+    except ImportError:
+        _ijson = ijson
+    _JSON_ERRORS: Tuple[Type[Exception], ...] = (
+        orjson.JSONDecodeError,
+        ijson.JSONError,
+    )
+except ImportError:
+    _ijson = None
+    _JSON_ERRORS = (orjson.JSONDecodeError,)
+
+# Maximum number of characters of a fetched page returned to the agent
+PREVIEW_CHARS = 2000
+
+# Bytes of a page read to build the preview; the rest is never downloaded
+PREVIEW_BYTES = 8 * 1024
+
+# Non-text/* content types that WebsiteFetcher still previews as text
+TEXT_CONTENT_TYPES: FrozenSet[str] = frozenset(
+    {
+        "application/json",
+        "application/xml",
+        "application/javascript",
+        "application/xhtml+xml",
+    }
+)
+
+# Tool results are compact JSON, since every byte costs the model tokens;
+# set AGENT_TOOL_PRETTY_JSON=1 to indent them for debugging
+_JSON_OPTIONS = (
+    orjson.OPT_INDENT_2 if os.environ.get("AGENT_TOOL_PRETTY_JSON") == "1" else 0
+)
+
+
+def _is_text(response: httpx.Response) -> bool:
+    """Check whether a response's content type is worth previewing as text
+
+    Responses without a Content-Type header are assumed to be text.
+    """
+    content_type = response.headers.get("Content-Type")
+    if content_type is None:
+        return True
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type in TEXT_CONTENT_TYPES
+        or media_type.endswith(("+json", "+xml"))
+    )
+
+
+def _safe_div(a: float, b: float) -> Union[float, str]:
+    """Divide a by b, returning an error message instead of raising on zero"""
+    if b == 0:
+        return "Error: Division by zero"
+    return a / b
+
+
+# Calculator operations by name; they return a number or an error message
+_OPS: Dict[str, Callable[[Any, Any], Any]] = {
+    "add": operator.add,
+    "subtract": operator.sub,
+    "multiply": operator.mul,
+    "divide": _safe_div,
+}
+
+# Argument types the calculator accepts; bool is excluded even though it is an int
+_NUMBER_TYPES = (int, float)
+
+# Successful web tool results are reused for identical calls within the TTL
+RESULT_CACHE_SIZE = 512
+RESULT_CACHE_TTL = 300.0
+_RESULTS: "TTLCache[Tuple[str, bytes], str]" = TTLCache(
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+)
+
+# Connection pool and timeouts shared by the tools' HTTP clients
+_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Failed connections are retried by the transport; these statuses are retried
+# with exponential backoff, as they usually mean the server is briefly busy
+MAX_RETRIES = 3
+RETRY_STATUSES: FrozenSet[int] = frozenset({429, 502, 503, 504})
+
+# TLS settings and the HTTP client are shared by every tool, but only created
+# on first use so importing this module stays cheap
+_SSL_CONTEXT: Optional[ssl.SSLContext] = None
+_CLIENT: Optional[httpx.Client] = None
+
+# Tool calls run on a thread pool, so parallel first calls must not each
+# create their own settings or client
+_INIT_LOCK = threading.Lock()
+
+
+def _get_ssl_context() -> ssl.SSLContext:
+    """Return the shared TLS settings, loading CA certificates only once"""
+    global _SSL_CONTEXT
+    if _SSL_CONTEXT is None:
+        with _INIT_LOCK:
+            if _SSL_CONTEXT is None:
+                _SSL_CONTEXT = httpx.create_ssl_context()
+    return _SSL_CONTEXT
+
+
+def _get_client() -> httpx.Client:
+    """Return the shared HTTP/2 client, which is closed when the interpreter exits"""
+    global _CLIENT
+    if _CLIENT is None:
+        # Load the TLS settings first, since that takes the same lock
+        verify = _get_ssl_context()
+        with _INIT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = httpx.Client(
+                    transport=httpx.HTTPTransport(
+                        http2=True,
+                        retries=MAX_RETRIES,
+                        verify=verify,
+                        limits=_LIMITS,
+                    ),
+                    timeout=_TIMEOUT,
+                    follow_redirects=True,
+                    headers={"User-Agent": "agent-workshop/1.0"},
+                )
+                atexit.register(_CLIENT.close)
+    return _CLIENT
+
+
+# Most async requests in flight to one host, so a burst of parallel tool
+# calls does not trip rate limits
+MAX_REQUESTS_PER_HOST = 10
+
+
+class AsyncHTTPSession:
+    """An async HTTP client shared by the web tools while the session is open
+
+    Use it as `async with AsyncHTTPSession():`. Tool calls made inside the
+    block, including in tasks it starts, share one connection pool, which is
+    closed when the block exits, and at most MAX_REQUESTS_PER_HOST of them
+    run against any one host at a time.
+    """
+
+    __slots__ = ("_client", "_token", "_slots")
+
+    def __init__(self) -> None:
+        """Create a session; the client is opened when it is entered"""
+        self._client: Optional[httpx.AsyncClient] = None
+        self._token: Optional["contextvars.Token[Optional[AsyncHTTPSession]]"] = None
+        # Request slots for the hosts that currently have requests in flight
+        self._slots: Dict[str, _HostSlot] = {}
+
+    @classmethod
+    def current(cls) -> AsyncContextManager[httpx.AsyncClient]:
+        """Return the client of the caller's open session, or of a new session
+
+        The new session is only open for the caller's `async with` block.
+        """
+        session = _SESSION.get()
+        if session is None or session._client is None:
+            return cls()
+        return _JoinedSession(session._client)
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        if self._client is not None:
+            raise RuntimeError("AsyncHTTPSession is already open")
+        self._client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=MAX_RETRIES,
+                verify=_get_ssl_context(),
+                limits=_LIMITS,
+            ),
+            timeout=_TIMEOUT,
+            follow_redirects=True,
+            headers={"User-Agent": "agent-workshop/1.0"},
+        )
+        self._token = _SESSION.set(self)
+        return self._client
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self._token is not None:
+            _SESSION.reset(self._token)
+            self._token = None
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+
+class _JoinedSession:
+    """Hands out the client of an open session without closing it on exit"""
+
+    __slots__ = ("_client",)
+
+    def __init__(self, client: httpx.AsyncClient):
+        self._client = client
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        return self._client
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+
+# The session the current task runs in, if any
+_SESSION: "contextvars.ContextVar[Optional[AsyncHTTPSession]]" = contextvars.ContextVar(
+    "agent_workshop_http_session", default=None
+)
+
+
+class _HostSlot:
+    """Bounds the async requests in flight to one host within a session
+
+    The slot removes itself from the session once no request is using or
+    waiting for it, so hosts that are no longer contacted are not kept.
+    """
+
+    __slots__ = ("_slots", "_host", "_semaphore", "_users")
+
+    def __init__(self, slots: Dict[str, "_HostSlot"], host: str):
+        self._slots = slots
+        self._host = host
+        self._semaphore = asyncio.Semaphore(MAX_REQUESTS_PER_HOST)
+        self._users = 0
+
+    async def __aenter__(self) -> None:
+        self._users += 1
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            self._leave()
+            raise
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._semaphore.release()
+        self._leave()
+
+    def _leave(self) -> None:
+        self._users -= 1
+        if self._users == 0:
+            del self._slots[self._host]
+
+
+def _host_slot(url: Union[str, httpx.URL]) -> _HostSlot:
+    """Return the slot bounding concurrent async requests to url's host
+
+    Slots are shared within the caller's AsyncHTTPSession; outside one, the
+    request gets a slot of its own.
+    """
+    session = _SESSION.get()
+    slots = session._slots if session is not None else {}
+    host = httpx.URL(url).host
+    slot = slots.get(host)
+    if slot is None:
+        slot = slots[host] = _HostSlot(slots, host)
+    return slot
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retrying after the given (zero-based) attempt"""
+    return min(30.0, 0.5 * 2.0**attempt)
+
+
+def _send_with_backoff(client: httpx.Client, request: httpx.Request) -> httpx.Response:
+    """Send a streaming request, retrying RETRY_STATUSES responses with backoff
+
+    The caller must close the returned response.
+    """
+    attempt = 0
+    while True:
+        response = client.send(request, stream=True)
+        if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+            return response
+
+        response.close()
+        time.sleep(_backoff_delay(attempt))
+        attempt += 1
+
+
+async def _asend_with_backoff(
+    client: httpx.AsyncClient, request: httpx.Request
+) -> httpx.Response:
+    """Like _send_with_backoff, for an async client"""
+    attempt = 0
+    while True:
+        response = await client.send(request, stream=True)
+        if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+            return response
+
+        await response.aclose()
+        await asyncio.sleep(_backoff_delay(attempt))
+        attempt += 1
 
 
 class Tool:
     """Base class for tools that agents can use"""
 
+    # Slots keep instances small; subclasses without __slots__ still get a
+    # __dict__ for their own attributes
+    __slots__ = ("name", "description", "parameters", "_dict_cache")
+
     def __init__(self, name: str, description: str, parameters: Dict[str, Any]):
         """Initialize a tool with name, description, and parameters"""
         self.name = name
         self.description = description
         self.parameters = parameters
+        self._dict_cache: Optional[Dict[str, Any]] = None
+
+    def _init_from_schema(self, schema: Dict[str, Any]) -> None:
+        """Initialize from a prebuilt class-level schema, which to_dict reuses"""
+        function = schema["function"]
+        Tool.__init__(
+            self, function["name"], function["description"], function["parameters"]
+        )
+        self._dict_cache = schema
+
+    def invalidate(self, arguments: str) -> None:
+        """Forget the cached result of a call with these arguments, if any"""
+        _RESULTS.pop(self._result_key(orjson.loads(arguments)))
+
+    def _result_key(self, args: Dict[str, Any]) -> Tuple[str, bytes]:
+        """Key a call in the result cache by tool name and canonical arguments"""
+        return self.name, orjson.dumps(args, option=orjson.OPT_SORT_KEYS)
 
     def to_dict(self) -> Dict[str, Any]:
-        """Convert tool to dictionary format for OpenAI API"""
+        """Convert tool to dictionary format for OpenAI API
+
+        The result is built once and shared between calls, so callers must not
+        modify it.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = self.function_schema(
+                self.name, self.description, self.parameters
+            )
+        return self._dict_cache
+
+    @staticmethod
+    def function_schema(
+        name: str, description: str, parameters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Build the OpenAI function tool schema for a tool definition"""
         return {
             "type": "function",
             "function": {
-                "name": self.name,
-                "description": self.description,
-                "parameters": self.parameters,
+                "name": name,
+                "description": description,
+                "parameters": parameters,
             },
         }
 
     def execute(self, arguments: str) -> str:
+        """Execute the tool with the JSON-encoded arguments sent by the model"""
+        return self.execute_parsed(orjson.loads(arguments))
+
+    def execute_parsed(self, args: Dict[str, Any]) -> str:
+        """Execute the tool with already decoded arguments"""
+        # Default implementation to be overridden by subclasses
+        raise NotImplementedError(
+            "Tool subclasses must implement execute_parsed or execute method"
+        )
+
+    async def execute_async(self, arguments: str) -> str:
+        """Execute the tool from async code
+
+        Runs execute in the default thread pool so blocking tools don't stall
+        the event loop. Tools that do I/O can override this with a native
+        async implementation.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.execute, arguments)
+
+    async def execute_async_many(self, arguments_list: List[str]) -> List[str]:
+        """Execute several calls of this tool concurrently
+
+        Results come back in the order of `arguments_list`, and a call that
+        raises yields an error message instead of failing the whole batch.
+        HTTP tools still respect MAX_REQUESTS_PER_HOST, and share one HTTP
+        session unless the caller already opened one.
+        """
+        async with AsyncHTTPSession.current():
+            results = await asyncio.gather(
+                *[self.execute_async(arguments) for arguments in arguments_list],
+                return_exceptions=True,
+            )
+        return [
+            result if isinstance(result, str) else f"Error: {str(result)}"
+            for result in results
+        ]
+
+
+class AsyncTool(Tool):
+    """Base class for tools implemented with async code"""
+
+    __slots__ = ()
+
+    async def execute_async(self, arguments: str) -> str:
         """Execute the tool with the given arguments"""
         # Default implementation to be overridden by subclasses
-        raise NotImplementedError("Tool subclasses must implement execute method")
+        raise NotImplementedError(
+            "AsyncTool subclasses must implement execute_async method"
+        )
+
+    def execute(self, arguments: str) -> str:
+        """Execute the tool from synchronous code"""
+        return asyncio.run(self.execute_async(arguments))
 
 
 class Calculator(Tool):
     """A simple calculator tool example"""
 
-    def __init__(self):
-        super().__init__(
-            name="calculator",
-            description="Perform simple arithmetic calculations",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "operation": {
-                        "type": "string",
-                        "enum": ["add", "subtract", "multiply", "divide"],
-                        "description": "The arithmetic operation to perform",
-                    },
-                    "a": {"type": "number", "description": "The first number"},
-                    "b": {"type": "number", "description": "The second number"},
+    __slots__ = ()
+
+    _SCHEMA: ClassVar[Dict[str, Any]] = Tool.function_schema(
+        name="calculator",
+        description="Perform simple arithmetic calculations",
+        parameters={
+            "type": "object",
+            "properties": {
+                "operation": {
+                    "type": "string",
+                    "enum": ["add", "subtract", "multiply", "divide"],
+                    "description": "The arithmetic operation to perform",
                 },
-                "required": ["operation", "a", "b"],
+                "a": {"type": "number", "description": "The first number"},
+                "b": {"type": "number", "description": "The second number"},
             },
-        )
+            "required": ["operation", "a", "b"],
+        },
+    )
 
-    def execute(self, arguments: str) -> str:
+    def __init__(self) -> None:
+        self._init_from_schema(self._SCHEMA)
+
+    def execute_parsed(self, args: Dict[str, Any]) -> str:
         """Execute the calculator with the given arguments"""
-        args = json.loads(arguments)
         operation = args["operation"]
         a = args["a"]
         b = args["b"]
 
-        if operation == "add":
-            return str(a + b)
-        elif operation == "subtract":
-            return str(a - b)
-        elif operation == "multiply":
-            return str(a * b)
-        elif operation == "divide":
-            if b == 0:
-                return "Error: Division by zero"
-            return str(a / b)
-        else:
+        fn = _OPS.get(operation)
+        if fn is None:
             return f"Error: Unknown operation {operation}"
 
+        # Exact type checks are cheap and stop strings from being concatenated
+        if type(a) not in _NUMBER_TYPES or type(b) not in _NUMBER_TYPES:
+            return "Error: a and b must be numbers"
+
+        result = fn(a, b)
+        return result if isinstance(result, str) else str(result)
+
 
 class WebsiteFetcher(Tool):
     """A tool to fetch the content of a website"""
 
-    def __init__(self):
-        super().__init__(
-            name="fetch_website",
-            description="Fetch the content of a website given a URL",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "url": {
-                        "type": "string",
-                        "description": "The URL of the website to fetch content from",
-                    },
+    __slots__ = ()
+
+    _SCHEMA: ClassVar[Dict[str, Any]] = Tool.function_schema(
+        name="fetch_website",
+        description="Fetch the content of a website given a URL",
+        parameters={
+            "type": "object",
+            "properties": {
+                "url": {
+                    "type": "string",
+                    "description": "The URL of the website to fetch content from",
                 },
-                "required": ["url"],
             },
-        )
+            "required": ["url"],
+        },
+    )
 
-    def execute(self, arguments: str) -> str:
+    def __init__(self) -> None:
+        self._init_from_schema(self._SCHEMA)
+
+    def execute_parsed(self, args: Dict[str, Any]) -> str:
         """Fetch content from the specified URL"""
-        args = json.loads(arguments)
         url = args["url"]
 
+        key = self._result_key(args)
+        cached = _RESULTS.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()  # Raise an exception for HTTP errors
+            # Stream the body and stop reading once the preview is filled
+            with _get_client().stream("GET", url) as response:
+                response.raise_for_status()  # Raise an exception for HTTP errors
+
+                body = bytearray()
+                complete = True
+
+                # Binary content such as images or PDFs is never downloaded
+                if _is_text(response):
+                    for chunk in response.iter_bytes(chunk_size=4096):
+                        body += chunk
+                        if len(body) >= PREVIEW_BYTES:
+                            complete = False
+                            break
+
+            result = self._format_result(response, body, complete)
+            if "no-store" not in response.headers.get("Cache-Control", "").lower():
+                _RESULTS.put(key, result)
+            return result
+
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            return f"Error fetching website: {str(e)}"
 
-            # Return a summary and truncate if it's too large
-            content_length = len(response.text)
-            content_preview = response.text[:2000]  # Get first 2000 chars
+    async def execute_async(self, arguments: str) -> str:
+        """Fetch content from the specified URL without blocking the event loop"""
+        args = orjson.loads(arguments)
+        url = args["url"]
+
+        key = self._result_key(args)
+        cached = _RESULTS.get(key)
+        if cached is not None:
+            return cached
 
-            result = {
+        try:
+            async with AsyncHTTPSession.current() as client, _host_slot(
+                url
+            ), client.stream("GET", url) as response:
+                response.raise_for_status()
+
+                body = bytearray()
+                complete = True
+
+                # Binary content such as images or PDFs is never downloaded
+                if _is_text(response):
+                    async for chunk in response.aiter_bytes(chunk_size=4096):
+                        body += chunk
+                        if len(body) >= PREVIEW_BYTES:
+                            complete = False
+                            break
+
+            result = self._format_result(response, body, complete)
+            if "no-store" not in response.headers.get("Cache-Control", "").lower():
+                _RESULTS.put(key, result)
+            return result
+
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            return f"Error fetching website: {str(e)}"
+
+    def _format_result(
+        self, response: httpx.Response, body: bytearray, complete: bool
+    ) -> str:
+        """Summarize a fetched page given the start of its body
+
+        `complete` tells whether `body` holds the whole page or was cut off
+        after PREVIEW_BYTES.
+        """
+        if not _is_text(response):
+            # The body of binary content was never read, so it cannot be counted
+            binary = {
                 "status_code": response.status_code,
-                "content_length": content_length,
-                "content_type": response.headers.get("Content-Type", "unknown"),
-                "content_preview": content_preview,
+                "content_length": self._content_length(response, body, False),
+                "content_type": response.headers.get("Content-Type"),
+                "note": "Binary content not previewed",
             }
+            return orjson.dumps(binary, option=_JSON_OPTIONS).decode()
 
-            if content_length > 2000:
-                result["note"] = (
-                    f"Content truncated (showing {2000}/{content_length} characters)"
-                )
+        try:
+            text = body[:PREVIEW_BYTES].decode(
+                response.encoding or "utf-8", errors="replace"
+            )
+        except LookupError:
+            # The server declared a charset Python does not know
+            text = body[:PREVIEW_BYTES].decode("utf-8", errors="replace")
 
-            return json.dumps(result, indent=2)
+        truncated = not complete or len(text) > PREVIEW_CHARS
+        content_preview = text[:PREVIEW_CHARS]
 
-        except requests.RequestException as e:
-            return f"Error fetching website: {str(e)}"
+        content_length = self._content_length(response, body, complete)
+
+        result = {
+            "status_code": response.status_code,
+            "content_length": content_length,
+            "content_type": response.headers.get("Content-Type", "unknown"),
+            "content_preview": content_preview,
+        }
+
+        if truncated:
+            size = (
+                f"{content_length} bytes"
+                if isinstance(content_length, int)
+                else content_length
+            )
+            result["note"] = (
+                f"Content truncated (showing the first {PREVIEW_CHARS} characters, "
+                f"total size {size})"
+            )
+
+        return orjson.dumps(result, option=_JSON_OPTIONS).decode()
+
+    @staticmethod
+    def _content_length(
+        response: httpx.Response, body: bytearray, complete: bool
+    ) -> Union[int, str]:
+        """Size of the page in bytes, or "unknown" if it can't be told cheaply
+
+        A fully read body is simply counted. Otherwise the Content-Length
+        header is used, unless the body was compressed in transit, in which
+        case the header gives the compressed size.
+        """
+        if complete:
+            return len(body)
+
+        header_length = response.headers.get("Content-Length")
+        if header_length and "Content-Encoding" not in response.headers:
+            return int(header_length)
+        return "unknown"
+
+
+# Search responses at least this large are streamed through ijson, below it
+# orjson on the whole body is faster
+STREAM_PARSE_BYTES = 64 * 1024
+
+# Search results returned when the model does not ask for a number, and the
+# longest snippet kept for each
+DEFAULT_NUM_RESULTS = 5
+SNIPPET_CHARS = 400
+
+# The parts of a SerpAPI response that SerpApiSearch returns, mapping their
+# dotted path in the response to the name they are returned under. Both the
+# ijson and orjson parsers extract exactly these.
+_SEARCH_FIELDS: Dict[str, str] = {
+    "search_information.total_results": "total_results",
+    "organic_results": "organic_results",
+    "answer_box": "answer_box",
+    "knowledge_graph": "knowledge_graph",
+    "related_searches": "related_searches",
+}
+_SEARCH_PATHS: List[Tuple[str, Tuple[str, ...]]] = [
+    (name, tuple(path.split("."))) for path, name in _SEARCH_FIELDS.items()
+]
+
+
+def _extract_search_fields(data: Any) -> Dict[str, Any]:
+    """Pick the returned fields out of a fully parsed SerpAPI response"""
+    fields: Dict[str, Any] = {}
+    for name, path in _SEARCH_PATHS:
+        value = data
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            fields[name] = value
+    return fields
+
+
+class _SearchFields:
+    """Builds the _SEARCH_FIELDS of a search response from ijson parse events"""
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self._builder: Any = None
+        self._path = ""
+
+    def event(self, prefix: str, event: str, value: Any) -> None:
+        """Consume one (prefix, event, value) tuple from ijson.parse"""
+        if self._builder is not None:
+            self._builder.event(event, value)
+            if prefix == self._path and event in ("end_map", "end_array"):
+                self.data[_SEARCH_FIELDS[self._path]] = self._builder.value
+                self._builder = None
+        elif prefix in _SEARCH_FIELDS and event != "map_key":
+            if event in ("start_map", "start_array"):
+                self._builder = ijson.ObjectBuilder()
+                self._builder.event(event, value)
+                self._path = prefix
+            elif value is not None:
+                self.data[_SEARCH_FIELDS[prefix]] = value
+
+
+class _ChunkReader:
+    """File-like reader over a byte stream whose start was already consumed
+
+    The pending bytes are held as a memoryview, so handing over the buffered
+    head and splitting chunks into reads does not copy what is left over.
+    """
+
+    def __init__(self, head: bytearray, chunks: Iterator[bytes]):
+        self._buffer = memoryview(head)
+        self._chunks = chunks
+
+    def read(self, size: int = -1) -> bytes:
+        """Return up to `size` bytes, or b"" at the end of the stream"""
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._buffer = memoryview(chunk)
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data.tobytes()
+
+
+class _AsyncChunkReader:
+    """Like _ChunkReader, for an async byte stream"""
+
+    def __init__(self, head: bytearray, chunks: AsyncIterator[bytes]):
+        self._buffer = memoryview(head)
+        self._chunks = chunks
+
+    async def read(self, size: int = -1) -> bytes:
+        """Return up to `size` bytes, or b"" at the end of the stream"""
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(await self._chunks.__anext__())
+            except StopAsyncIteration:
+                return b""
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data.tobytes()
+
+
+def _read_search_data(chunks: Iterator[bytes]) -> Dict[str, Any]:
+    """Parse the returned fields from a SerpAPI response body
+
+    Bodies of STREAM_PARSE_BYTES or more are streamed through ijson when it is
+    installed; smaller ones are parsed whole with orjson, straight from the
+    buffered bytes without decoding them to a str first.
+    """
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if _ijson is not None and len(head) >= STREAM_PARSE_BYTES:
+            fields = _SearchFields()
+            reader = _ChunkReader(head, chunks)
+            for prefix, event, value in _ijson.parse(reader, use_float=True):
+                fields.event(prefix, event, value)
+            return fields.data
+    return _extract_search_fields(orjson.loads(head))
+
+
+async def _aread_search_data(chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """Like _read_search_data, for an async byte stream"""
+    head = bytearray()
+    async for chunk in chunks:
+        head += chunk
+        if _ijson is not None and len(head) >= STREAM_PARSE_BYTES:
+            fields = _SearchFields()
+            reader = _AsyncChunkReader(head, chunks)
+            async for prefix, event, value in _ijson.parse_async(
+                reader, use_float=True
+            ):
+                fields.event(prefix, event, value)
+            return fields.data
+    return _extract_search_fields(orjson.loads(head))
 
 
 class SerpApiSearch(Tool):
     """A tool to perform Google searches using SerpAPI"""
 
+    __slots__ = ("api_key", "_base_params")
+
+    # SerpAPI endpoint used for every search
+    _BASE_URL = "https://serpapi.com/search"
+
+    _SCHEMA: ClassVar[Dict[str, Any]] = Tool.function_schema(
+        name="google_search",
+        description="Search the web using Google Search API via SerpAPI",
+        parameters={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "The search query to look up on Google",
+                },
+                "num_results": {
+                    "type": "integer",
+                    "description": "The number of search results to return (default: 5)",
+                },
+                "location": {
+                    "type": "string",
+                    "description": "Optional location to tailor search results to a specific area",
+                },
+            },
+            "required": ["query"],
+        },
+    )
+
     def __init__(self, api_key: Optional[str] = None):
         """Initialize the SerpAPI search tool with an API key"""
         self.api_key = api_key or os.environ.get("SERPAPI_API_KEY")
@@ -134,75 +820,150 @@ class SerpApiSearch(Tool):
                 "SerpAPI API key is required. Set SERPAPI_API_KEY environment variable or pass it as a parameter."
             )
 
-        super().__init__(
-            name="google_search",
-            description="Search the web using Google Search API via SerpAPI",
-            parameters={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "The search query to look up on Google",
-                    },
-                    "num_results": {
-                        "type": "integer",
-                        "description": "The number of search results to return (default: 5)",
-                    },
-                    "location": {
-                        "type": "string",
-                        "description": "Optional location to tailor search results to a specific area",
-                    },
-                },
-                "required": ["query"],
-            },
-        )
+        self._init_from_schema(self._SCHEMA)
 
-    def execute(self, arguments: str) -> str:
+        # Parameters shared by every search, so calls only fill in the query.
+        # This is the only place the API key is read after validation; it is
+        # typed read-only, as a MappingProxyType could not be pickled.
+        self._base_params: Mapping[str, Any] = {
+            "engine": "google",
+            "api_key": self.api_key,
+            "num": DEFAULT_NUM_RESULTS,
+        }
+
+    def execute_parsed(self, args: Dict[str, Any]) -> str:
         """Execute a Google search using SerpAPI"""
-        args = json.loads(arguments)
         query = args["query"]
-        num_results = args.get("num_results", 5)
-        location = args.get("location", "")
-
-        try:
-            # Prepare the SerpAPI parameters
-            params = {
-                "engine": "google",
-                "q": query,
-                "api_key": self.api_key,
-                "num": num_results,
-            }
 
-            # Add location if provided
-            if location:
-                params["location"] = location
+        key = self._result_key(args)
+        cached = _RESULTS.get(key)
+        if cached is not None:
+            return cached
 
-            # Make the request to SerpAPI
-            response = requests.get(
-                "https://serpapi.com/search", params=params, timeout=30
+        try:
+            # Make the request to SerpAPI and parse the results as they arrive
+            client = _get_client()
+            request = client.build_request(
+                "GET",
+                self._BASE_URL,
+                params=self._params(args),
+                timeout=30,
             )
-            response.raise_for_status()
-
-            # Parse the results
-            data = response.json()
-
-            # Format and return search results
-            search_results = {
-                "query": query,
-                "total_results": data.get("search_information", {}).get(
-                    "total_results", "Unknown"
-                ),
-                "organic_results": data.get("organic_results", []),
-                "answer_box": data.get("answer_box", None),
-                "knowledge_graph": data.get("knowledge_graph", None),
-                "related_searches": data.get("related_searches", []),
-            }
+            response = _send_with_backoff(client, request)
+            try:
+                response.raise_for_status()
+                fields = _read_search_data(response.iter_bytes())
+            finally:
+                response.close()
+
+            result = self._format_results(query, fields, self._limit(args))
+            _RESULTS.put(key, result)
+            return result
+
+        except httpx.HTTPError as e:
+            return f"Error performing Google search: {self._redact(str(e))}"
+        except _JSON_ERRORS:
+            return f"Error parsing search results. Response was not valid JSON."
+        except Exception as e:
+            return f"Unexpected error performing search: {str(e)}"
+
+    async def execute_async(self, arguments: str) -> str:
+        """Execute a Google search using SerpAPI without blocking the event loop"""
+        args = orjson.loads(arguments)
+        query = args["query"]
 
-            return json.dumps(search_results, indent=2)
+        key = self._result_key(args)
+        cached = _RESULTS.get(key)
+        if cached is not None:
+            return cached
 
-        except requests.RequestException as e:
-            return f"Error performing Google search: {str(e)}"
-        except json.JSONDecodeError:
+        try:
+            async with AsyncHTTPSession.current() as client:
+                request = client.build_request(
+                    "GET",
+                    self._BASE_URL,
+                    params=self._params(args),
+                    timeout=30,
+                )
+                async with _host_slot(request.url):
+                    response = await _asend_with_backoff(client, request)
+                    try:
+                        response.raise_for_status()
+                        fields = await _aread_search_data(response.aiter_bytes())
+                    finally:
+                        await response.aclose()
+
+            result = self._format_results(query, fields, self._limit(args))
+            _RESULTS.put(key, result)
+            return result
+
+        except httpx.HTTPError as e:
+            return f"Error performing Google search: {self._redact(str(e))}"
+        except _JSON_ERRORS:
             return f"Error parsing search results. Response was not valid JSON."
         except Exception as e:
             return f"Unexpected error performing search: {str(e)}"
+
+    def _redact(self, message: str) -> str:
+        """Remove the API key from an error message, which may quote the URL"""
+        return message.replace(self._base_params["api_key"], "***")
+
+    @staticmethod
+    def _limit(args: Dict[str, Any]) -> int:
+        """Return the number of results to keep, accepting "3" or 3.0 from the model"""
+        try:
+            return int(args.get("num_results", DEFAULT_NUM_RESULTS))
+        except (TypeError, ValueError):
+            return DEFAULT_NUM_RESULTS
+
+    def _params(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the SerpAPI query parameters for the tool arguments"""
+        params = {**self._base_params, "q": args["query"]}
+
+        num_results = args.get("num_results")
+        if num_results is not None:
+            params["num"] = num_results
+
+        # Add location if provided
+        location = args.get("location", "")
+        if location:
+            params["location"] = location
+
+        return params
+
+    def _format_results(self, query: str, fields: Dict[str, Any], limit: int) -> str:
+        """Format the extracted parts of a SerpAPI response for the agent
+
+        Results are cut down to the keys the agent needs, with at most
+        `limit` organic results, to keep the output small.
+        """
+        organic_results = [
+            {
+                "title": result.get("title"),
+                "link": result.get("link"),
+                "snippet": (result.get("snippet") or "")[:SNIPPET_CHARS],
+            }
+            for result in fields.get("organic_results", [])[:limit]
+        ]
+
+        knowledge_graph = fields.get("knowledge_graph")
+        if knowledge_graph is not None:
+            knowledge_graph = {
+                "title": knowledge_graph.get("title"),
+                "description": knowledge_graph.get("description"),
+                "source": knowledge_graph.get("source"),
+            }
+
+        search_results = {
+            "query": query,
+            "total_results": fields.get("total_results", "Unknown"),
+            "organic_results": organic_results,
+            "answer_box": fields.get("answer_box"),
+            "knowledge_graph": knowledge_graph,
+            "related_searches": [
+                {"query": search.get("query")}
+                for search in fields.get("related_searches", [])
+            ],
+        }
+
+        return orjson.dumps(search_results, option=_JSON_OPTIONS).decode()